@@ -12,6 +12,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import functools
+
 from nemo.collections.nlp.modules.common.megatron.utils import ApexGuardDefaults
 
 try:
@@ -41,6 +43,8 @@ from .falcon_decoder_layer import FalconTransformerLayer
 
 
 # Use this spec for an implementation using modules in TE
+# The spec is only read when building the layers, so the same instance is shared by all the callers.
+@functools.lru_cache(maxsize=1)
 def get_falcon_layer_spec() -> ModuleSpec:
     if not HAVE_MEGATRON_CORE:
         raise ImportError(
@@ -49,6 +49,7 @@ QUANT_CFG_CHOICES = {
     "w4a8_awq": mtq.W4A8_AWQ_BETA_CFG,
     "int4": mtq.INT4_BLOCKWISE_WEIGHT_ONLY_CFG,
 }
+KV_CACHE_DTYPE_CHOICES = {"int8": 8, "fp8": (4, 3)}  # Number of bits for KV cache output quantizers
 
 
 class Quantizer:
@@ -86,6 +87,7 @@ class Quantizer:
             - decoder_type: str
             - awq_block_size: int (only for awq algorithms)
             - sq_alpha: float (only for smooth quant algorithms)
+            - kv_cache_dtype: str (optional, chosen based on the algorithm if not set)
 
         Expected keys in `export_config`:
             - dtype: str/int
@@ -113,15 +115,22 @@ class Quantizer:
                     weight_quantizer = weight_quantizer[0]
                 weight_quantizer["block_sizes"][-1] = quantization_config.awq_block_size
 
-            # Always turn on FP8 kv cache to save memory footprint.
-            # For int8_sq, we use int8 kv cache.
-            # TODO: Investigate why enabling FP8 kv cache will cause accuracy regressions for Nemotron.
-            enable_quant_kv_cache = (
-                "int8" not in quantization_config.algorithm and quantization_config.decoder_type != "gptnext"
-            )
+            kv_cache_dtype = quantization_config.get("kv_cache_dtype", None)
+            if kv_cache_dtype is None:
+                # Always turn on FP8 kv cache to save memory footprint.
+                # For int8_sq, we use int8 kv cache.
+                # TODO: Investigate why enabling FP8 kv cache will cause accuracy regressions for Nemotron.
+                enable_quant_kv_cache = (
+                    "int8" not in quantization_config.algorithm and quantization_config.decoder_type != "gptnext"
+                )
+                kv_cache_num_bits = 8 if quantization_config.algorithm == "int8_sq" else (4, 3)
+            else:
+                assert kv_cache_dtype in KV_CACHE_DTYPE_CHOICES, f"Unsupported KV cache dtype: {kv_cache_dtype}"
+                enable_quant_kv_cache = True
+                kv_cache_num_bits = KV_CACHE_DTYPE_CHOICES[kv_cache_dtype]
             logging.info(f'{"Enabled" if enable_quant_kv_cache else "Disabled"} KV cache quantization')
             quant_cfg["quant_cfg"]["*output_quantizer"] = {
-                "num_bits": 8 if quantization_config.algorithm == "int8_sq" else (4, 3),
+                "num_bits": kv_cache_num_bits,
                 "axis": None,
                 "enable": enable_quant_kv_cache,
             }
@@ -50,6 +50,13 @@ class TestParallelFalconTransformerLayer:
         num_weights = sum([p.numel() for p in parallel_falcon_transformer_layer.parameters()])
         assert num_weights == 1884
 
+    @pytest.mark.unit
+    def test_layer_spec_is_cached(self):
+        layer_spec = get_falcon_layer_spec()
+        hits = get_falcon_layer_spec.cache_info().hits
+        assert layer_spec is get_falcon_layer_spec()
+        assert get_falcon_layer_spec.cache_info().hits == hits + 1
+
     @pytest.mark.unit
     def test_gpu_forward(self):
         parallel_transformer_layer = self.parallel_falcon_transformer_layer
@@ -14,97 +14,189 @@
 
 
 import argparse
+import functools
+import hashlib
 import json
+import multiprocessing
+import os
 import shutil
 import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 
+import numpy as np
 import torch
 
 from nemo.deploy.nlp.megatronllm_deployable import MegatronLLMDeployable
 from tests.infer_data_path import get_infer_test_data
 
+try:
+    import orjson
+
+    HAVE_ORJSON = True
+except (ImportError, ModuleNotFoundError):
+    HAVE_ORJSON = False
+
 run_export_tests = True
 try:
     from nemo.deploy import DeployPyTriton
     from nemo.deploy.nlp import NemoQueryLLM
     from nemo.export import TensorRTLLM
+    from nemo.export.trt_llm.qnemo.utils import is_qnemo_checkpoint
 except Exception as e:
     run_export_tests = False
 
+# Quantized test checkpoints are the qnemo files produced by
+# examples/nlp/language_modeling/megatron_gpt_quantization.py and registered
+# in the test data under the name of the base model plus the suffix below.
+QUANTIZED_MODEL_SUFFIXES = {
+    "fp8": "fp8",
+    "int8_sq": "int8",
+    "int4_awq": "int4",
+}
+
+# Above this batch size the dequantization of the INT4 AWQ weights makes the engine compute bound
+# and the weight-only quantization stops paying off.
+INT4_AWQ_MAX_BATCH_SIZE = 32
+
+# Written into a cached engine directory once the export has finished, so that the engine
+# of an interrupted build is exported again instead of being loaded.
+ENGINE_BUILD_COMPLETE_FILE = ".build_complete"
+
+
+def get_engine_cache_dir(engine_cache_dir, *engine_args):
+    # Engines only depend on the checkpoint and the build parameters, so an engine built
+    # by a previous run with the same parameters can be loaded instead of exported again.
+    key = hashlib.blake2b(repr(engine_args).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(engine_cache_dir, key)
+
+
+def get_checkpoint_stamp(path):
+    # The test checkpoints are replaced in place when they are downloaded again, so the engine cache key
+    # includes their modification time and size besides the path. Directory checkpoints are stamped by
+    # their newest file and total size.
+    if path is None or not os.path.exists(path):
+        return None
+
+    if not os.path.isdir(path):
+        return os.path.getmtime(path), os.path.getsize(path)
+
+    mtime = os.path.getmtime(path)
+    size = 0
+    for root, _, files in os.walk(path):
+        for file in files:
+            file_path = os.path.join(root, file)
+            mtime = max(mtime, os.path.getmtime(file_path))
+            size += os.path.getsize(file_path)
+    return mtime, size
+
 
-def get_accuracy_with_lambada(model, nq, task_ids, lora_uids, test_data_path=None):
+@functools.lru_cache(maxsize=None)
+def checkpoint_exists(path):
+    # Checkpoints do not change during a test run, so every path is only checked once
+    # even though each iteration of the gpu sweep looks the same checkpoints up again.
+    return os.path.exists(path)
+
+
+def load_test_data(test_data_path):
+    if HAVE_ORJSON:
+        with open(test_data_path, 'rb') as file:
+            return orjson.loads(file.read())
+
+    with open(test_data_path, 'r') as file:
+        return json.load(file)
+
+
+def iter_test_data_batches(test_data_path, batch_size, records=None):
+    if records is None:
+        records = load_test_data(test_data_path)
+    for i in range(0, len(records), batch_size):
+        yield records[i : i + batch_size]
+
+
+def get_accuracy_with_lambada(model, nq, task_ids, lora_uids, test_data_path=None, batch_size=8, records=None):
     # lambada dataset based accuracy test, which includes more than 5000 sentences.
     # Use generated last token with original text's last token for accuracy comparison.
     # If the generated last token start with the original token, trtllm_correct make an increment.
-    # It generates a CSV file for text comparison detail.
+    # Prompts are sent to the model in batches of batch_size to amortize the per-call overhead.
+    # Already loaded records can be passed in, otherwise they are read from test_data_path.
 
     if test_data_path is None:
         raise Exception("test_data_path cannot be None.")
 
-    trtllm_correct = 0
-    trtllm_deployed_correct = 0
-    trtllm_correct_relaxed = 0
-    trtllm_deployed_correct_relaxed = 0
     all_expected_outputs = []
     all_trtllm_outputs = []
+    all_trtllm_deployed_outputs = []
+
+    # All the prompts are scored with the first adapter, so a whole batch shares the same LoRA weights.
+    lora_uid = None if lora_uids is None else lora_uids[0]
+
+    # The evaluation time covers inference, normalization and scoring. When the records are passed in,
+    # parsing the test data is not part of it.
+    eval_start = time.perf_counter()
+    batches = []
+    for batch_records in iter_test_data_batches(test_data_path, batch_size, records):
+        batch = [record["text_before_last_word"] for record in batch_records]
+        batches.append(batch)
+        all_expected_outputs.extend(record["last_word"] for record in batch_records)
+
+        trtllm_output = model.forward(
+            input_texts=batch,
+            max_output_len=1,
+            top_k=1,
+            top_p=0,
+            temperature=0.1,
+            task_ids=task_ids,
+            lora_uids=None if lora_uid is None else [lora_uid] * len(batch),
+        )
+        all_trtllm_outputs.extend(output[0] for output in trtllm_output)
 
-    with open(test_data_path, 'r') as file:
-        records = json.load(file)
-
-        eval_start = time.perf_counter()
-        for record in records:
-            prompt = record["text_before_last_word"]
-            expected_output = record["last_word"].strip().lower()
-            trtllm_output = model.forward(
-                input_texts=[prompt],
+    if nq is not None:
+
+        def query_batch(batch):
+            return nq.query_llm(
+                prompts=batch,
                 max_output_len=1,
                 top_k=1,
                 top_p=0,
                 temperature=0.1,
-                task_ids=task_ids,
-                lora_uids=lora_uids,
+                task_id=task_ids,
             )
-            trtllm_output = trtllm_output[0][0].strip().lower()
-
-            all_expected_outputs.append(expected_output)
-            all_trtllm_outputs.append(trtllm_output)
-
-            if expected_output == trtllm_output:
-                trtllm_correct += 1
-
-            if (
-                expected_output == trtllm_output
-                or trtllm_output.startswith(expected_output)
-                or expected_output.startswith(trtllm_output)
-            ):
-                if len(trtllm_output) == 1 and len(expected_output) > 1:
-                    continue
-                trtllm_correct_relaxed += 1
-
-            if nq is not None:
-                trtllm_deployed_output = nq.query_llm(
-                    prompts=[prompt],
-                    max_output_len=1,
-                    top_k=1,
-                    top_p=0,
-                    temperature=0.1,
-                    task_id=task_ids,
-                )
-                trtllm_deployed_output = trtllm_deployed_output[0][0].strip().lower()
 
-                if expected_output == trtllm_deployed_output:
-                    trtllm_deployed_correct += 1
-
-                if (
-                    expected_output == trtllm_deployed_output
-                    or trtllm_deployed_output.startswith(expected_output)
-                    or expected_output.startswith(trtllm_deployed_output)
-                ):
-                    if len(trtllm_deployed_output) == 1 and len(expected_output) > 1:
-                        continue
-                    trtllm_deployed_correct_relaxed += 1
-        eval_end = time.perf_counter()
+        # The deployed model is served from the same engine in this process, so it cannot run concurrently
+        # with model.forward. Keeping two requests in flight lets the client side encoding and HTTP transfer
+        # of one batch overlap the generation of the other one, the engine still runs the batches one by one.
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            for batch, trtllm_deployed_output in zip(batches, executor.map(query_batch, batches)):
+                assert len(trtllm_deployed_output) == len(batch)
+                all_trtllm_deployed_outputs.extend(output[0] for output in trtllm_deployed_output)
+
+    # The words are normalized in a single pass each, once all of them are collected.
+    all_expected_outputs = [word.strip().lower() for word in all_expected_outputs]
+    all_trtllm_outputs = [word.strip().lower() for word in all_trtllm_outputs]
+    all_trtllm_deployed_outputs = [word.strip().lower() for word in all_trtllm_deployed_outputs]
+
+    startswith = np.frompyfunc(str.startswith, 2, 1)
+    str_len = np.frompyfunc(len, 1, 1)
+    expected = np.array(all_expected_outputs, dtype=object)
+    expected_lens = str_len(expected).astype(np.int64)
+
+    def count_correct(outputs):
+        if len(outputs) == 0:
+            return 0, 0
+
+        outputs = np.array(outputs, dtype=object)
+        output_lens = str_len(outputs).astype(np.int64)
+        correct = (expected == outputs).astype(bool)
+        # A single character output only counts as a relaxed match if the expected word is a single character too.
+        correct_relaxed = (
+            correct | startswith(outputs, expected).astype(bool) | startswith(expected, outputs).astype(bool)
+        ) & ~((output_lens == 1) & (expected_lens > 1))
+        return int(correct.sum()), int(correct_relaxed.sum())
+
+    trtllm_correct, trtllm_correct_relaxed = count_correct(all_trtllm_outputs)
+    trtllm_deployed_correct, trtllm_deployed_correct_relaxed = count_correct(all_trtllm_deployed_outputs)
+    eval_end = time.perf_counter()
 
     trtllm_accuracy = trtllm_correct / len(all_expected_outputs)
     trtllm_accuracy_relaxed = trtllm_correct_relaxed / len(all_expected_outputs)
@@ -164,10 +256,12 @@ def run_trt_llm_inference(
     use_embedding_sharing=False,
     max_input_len=128,
     max_output_len=128,
+    max_num_tokens=None,
     ptuning=False,
     p_tuning_checkpoint=None,
     lora=False,
     lora_checkpoint=None,
+    lora_uids=None,
     tp_size=None,
     pp_size=None,
     top_k=1,
@@ -181,8 +275,10 @@ def run_trt_llm_inference(
     test_data_path=None,
     backend="TensorRT-LLM",
     save_trt_engine=False,
+    quantization=None,
+    engine_cache_dir=None,
 ):
-    if Path(checkpoint_path).exists():
+    if checkpoint_exists(checkpoint_path):
         if n_gpu > torch.cuda.device_count():
             print(
                 "Path: {0} and model: {1} with {2} gpus won't be tested since available # of gpus = {3}".format(
@@ -191,7 +287,13 @@ def run_trt_llm_inference(
             )
             return None, None, None, None, None
 
-        Path(trt_llm_model_dir).mkdir(parents=True, exist_ok=True)
+        if quantization is not None and not is_qnemo_checkpoint(checkpoint_path):
+            raise Exception(
+                "Checkpoint {0} is not a {1} quantized qnemo checkpoint. Please quantize it with "
+                "examples/nlp/language_modeling/megatron_gpt_quantization.py first.".format(
+                    checkpoint_path, quantization
+                )
+            )
 
         if debug:
             print("")
@@ -202,13 +304,21 @@ def run_trt_llm_inference(
             print("")
 
             print("Path: {0} and model: {1} with {2} gpus will be tested".format(checkpoint_path, model_name, n_gpu))
+            if quantization is not None:
+                print("---- Quantization: {0}".format(quantization))
+
+        if quantization == "int4_awq" and max_batch_size > INT4_AWQ_MAX_BATCH_SIZE:
+            print(
+                "---- Warning: int4_awq is not expected to be faster than the unquantized model "
+                "with max_batch_size {0} > {1}.".format(max_batch_size, INT4_AWQ_MAX_BATCH_SIZE)
+            )
 
         prompt_embeddings_checkpoint_path = None
         task_ids = None
         max_prompt_embedding_table_size = 0
 
         if ptuning:
-            if Path(p_tuning_checkpoint).exists():
+            if checkpoint_exists(p_tuning_checkpoint):
                 prompt_embeddings_checkpoint_path = p_tuning_checkpoint
                 max_prompt_embedding_table_size = 8192
                 task_ids = ["0"]
@@ -219,14 +329,16 @@ def run_trt_llm_inference(
                 return None, None, None, None, None
 
         lora_ckpt_list = None
-        lora_uids = None
         use_lora_plugin = None
         lora_target_modules = None
 
-        if lora:
-            if Path(lora_checkpoint).exists():
+        if not lora:
+            lora_uids = None
+        else:
+            if checkpoint_exists(lora_checkpoint):
                 lora_ckpt_list = [lora_checkpoint]
-                lora_uids = ["0", "-1", "0"]
+                if lora_uids is None:
+                    lora_uids = ["0", "-1", "0"]
                 use_lora_plugin = "bfloat16"
                 lora_target_modules = ["attn_qkv"]
                 if debug:
@@ -235,25 +347,77 @@ def run_trt_llm_inference(
                 print("---- LoRA could not be enabled and skipping the test.")
                 return None, None, None, None, None
 
-        trt_llm_exporter = TensorRTLLM(trt_llm_model_dir, lora_ckpt_list, load_model=False)
+        test_data_future = None
+        if run_accuracy:
+            if test_data_path is None:
+                raise Exception("test_data_path cannot be None.")
+
+            # Parse the test data in the background while the engine is being built.
+            executor = ThreadPoolExecutor(max_workers=1)
+            test_data_future = executor.submit(load_test_data, test_data_path)
+            executor.shutdown(wait=False)
+
+        if max_num_tokens is None:
+            max_num_tokens = int(max_input_len * max_batch_size * 0.2)
+
+        if engine_cache_dir is not None:
+            trt_llm_model_dir = get_engine_cache_dir(
+                engine_cache_dir,
+                model_name,
+                model_type,
+                checkpoint_path,
+                get_checkpoint_stamp(checkpoint_path),
+                tp_size,
+                pp_size,
+                n_gpu,
+                quantization,
+                max_batch_size,
+                max_input_len,
+                max_output_len,
+                max_num_tokens,
+                use_embedding_sharing,
+                ptuning,
+                prompt_embeddings_checkpoint_path,
+                get_checkpoint_stamp(prompt_embeddings_checkpoint_path),
+                lora,
+                lora_ckpt_list,
+                [get_checkpoint_stamp(lora_ckpt) for lora_ckpt in lora_ckpt_list or []],
+                lora_target_modules,
+            )
 
-        trt_llm_exporter.export(
-            nemo_checkpoint_path=checkpoint_path,
-            model_type=model_type,
-            n_gpus=n_gpu,
-            tensor_parallelism_size=tp_size,
-            pipeline_parallelism_size=pp_size,
-            max_input_len=max_input_len,
-            max_output_len=max_output_len,
-            max_batch_size=max_batch_size,
-            max_prompt_embedding_table_size=max_prompt_embedding_table_size,
-            use_lora_plugin=use_lora_plugin,
-            lora_target_modules=lora_target_modules,
-            max_num_tokens=int(max_input_len * max_batch_size * 0.2),
-            opt_num_tokens=60,
-            use_embedding_sharing=use_embedding_sharing,
-            save_nemo_model_config=True,
-        )
+        if engine_cache_dir is not None and Path(trt_llm_model_dir, ENGINE_BUILD_COMPLETE_FILE).exists():
+            if debug:
+                print("---- Loading the cached engine from {0}".format(trt_llm_model_dir))
+            trt_llm_exporter = TensorRTLLM(trt_llm_model_dir, lora_ckpt_list, load_model=True)
+        else:
+            Path(trt_llm_model_dir).mkdir(parents=True, exist_ok=True)
+            trt_llm_exporter = TensorRTLLM(trt_llm_model_dir, lora_ckpt_list, load_model=False)
+
+            # The paged KV cache, padding and context FMHA options only apply to the .nemo checkpoints,
+            # the engines of the quantized .qnemo checkpoints are configured by ModelOpt when they are built.
+            trt_llm_exporter.export(
+                nemo_checkpoint_path=checkpoint_path,
+                model_type=model_type,
+                n_gpus=n_gpu,
+                tensor_parallelism_size=tp_size,
+                pipeline_parallelism_size=pp_size,
+                max_input_len=max_input_len,
+                max_output_len=max_output_len,
+                max_batch_size=max_batch_size,
+                max_prompt_embedding_table_size=max_prompt_embedding_table_size,
+                use_lora_plugin=use_lora_plugin,
+                lora_target_modules=lora_target_modules,
+                paged_kv_cache=True,
+                remove_input_padding=True,
+                paged_context_fmha=True,
+                max_num_tokens=max_num_tokens,
+                opt_num_tokens=60,
+                use_embedding_sharing=use_embedding_sharing,
+                save_nemo_model_config=True,
+            )
+
+            if engine_cache_dir is not None:
+                Path(trt_llm_model_dir, ENGINE_BUILD_COMPLETE_FILE).touch()
 
         if ptuning:
             trt_llm_exporter.add_prompt_table(
@@ -285,9 +449,12 @@ def run_trt_llm_inference(
         nm = None
         output_deployed = ""
         if test_deployment:
+            # Cap Triton's dynamic batching at the engine limit so queued requests are never merged into
+            # a batch the engine rejects.
             nm = DeployPyTriton(
                 model=trt_llm_exporter,
                 triton_model_name=model_name,
+                max_batch_size=max_batch_size,
                 port=8000,
             )
             nm.deploy()
@@ -315,18 +482,26 @@ def run_trt_llm_inference(
 
         if run_accuracy:
             print("Start model accuracy testing ...")
-            result = get_accuracy_with_lambada(trt_llm_exporter, nq, task_ids, lora_uids, test_data_path)
+            result = get_accuracy_with_lambada(
+                trt_llm_exporter,
+                nq,
+                task_ids,
+                lora_uids,
+                test_data_path,
+                batch_size=max_batch_size,
+                records=test_data_future.result(),
+            )
             if test_deployment:
                 nm.stop()
 
-            if not save_trt_engine:
+            if not save_trt_engine and engine_cache_dir is None:
                 shutil.rmtree(trt_llm_model_dir)
             return result
 
         if test_deployment:
             nm.stop()
 
-        if not save_trt_engine:
+        if not save_trt_engine and engine_cache_dir is None:
             shutil.rmtree(trt_llm_model_dir)
 
         return None, None, None, None, None
@@ -362,6 +537,7 @@ def run_existing_checkpoints(
     pp_size=None,
     ptuning=False,
     lora=False,
+    lora_uids=None,
     streaming=False,
     run_accuracy=False,
     test_deployment=False,
@@ -369,6 +545,9 @@ def run_existing_checkpoints(
     test_data_path=None,
     backend="tensorrt-llm",
     save_trt_engine=False,
+    quantization=None,
+    engine_cache_dir=None,
+    max_num_tokens=None,
 ):
     if n_gpus > torch.cuda.device_count():
         print("Skipping the test due to not enough number of GPUs")
@@ -378,6 +557,12 @@ def run_existing_checkpoints(
     if not (model_name in test_data.keys()):
         raise Exception("Model {0} is not supported.".format(model_name))
 
+    if quantization is not None:
+        quantized_model_name = "{0}-{1}".format(model_name, QUANTIZED_MODEL_SUFFIXES[quantization])
+        if not (quantized_model_name in test_data.keys()):
+            raise Exception("There is no {0} checkpoint defined for model {1}.".format(quantization, model_name))
+        model_name = quantized_model_name
+
     model_info = test_data[model_name]
 
     if n_gpus < model_info["min_gpus"]:
@@ -425,10 +610,12 @@ def run_existing_checkpoints(
             use_embedding_sharing=use_embedding_sharing,
             max_input_len=512,
             max_output_len=model_info["max_output_len"],
+            max_num_tokens=max_num_tokens,
             ptuning=ptuning,
             p_tuning_checkpoint=p_tuning_checkpoint,
             lora=lora,
             lora_checkpoint=lora_checkpoint,
+            lora_uids=lora_uids,
             tp_size=tp_size,
             pp_size=pp_size,
             top_k=1,
@@ -441,6 +628,8 @@ def run_existing_checkpoints(
             test_deployment=test_deployment,
             test_data_path=test_data_path,
             save_trt_engine=save_trt_engine,
+            quantization=quantization,
+            engine_cache_dir=engine_cache_dir,
         )
 
 
@@ -500,6 +689,12 @@ def get_args():
         type=int,
         default=128,
     )
+    parser.add_argument(
+        "--max_num_tokens",
+        type=int,
+        default=None,
+        help="Max number of tokens the engine processes in one step. Defaults to 20%% of max_input_len * max_batch_size.",
+    )
     parser.add_argument(
         "--p_tuning_checkpoint",
         type=str,
@@ -518,6 +713,13 @@ def get_args():
         default=False,
         action='store_true',
     )
+    parser.add_argument(
+        "--lora_uids",
+        type=str,
+        default=None,
+        nargs="+",
+        help="LoRA uids for the test prompts. The accuracy test uses the first one for all the prompts.",
+    )
     parser.add_argument(
         "--tp_size",
         type=int,
@@ -581,10 +783,142 @@ def get_args():
         type=str,
         default="False",
     )
+    parser.add_argument(
+        "--quantization",
+        type=str,
+        default=None,
+        choices=list(QUANTIZED_MODEL_SUFFIXES.keys()),
+        help="Quantization of the engine. Defaults to the checkpoint precision.",
+    )
+    parser.add_argument(
+        "--engine_cache_dir",
+        type=str,
+        default=None,
+        help="Folder to keep the built engines in and to reuse them from when the build parameters match.",
+    )
+    parser.add_argument(
+        "--parallel_sweep",
+        default=False,
+        action='store_true',
+        help="Run the tests for the different numbers of gpus concurrently on disjoint sets of gpus.",
+    )
 
     return parser.parse_args()
 
 
+def run_test(args, n_gpus):
+    if args.existing_test_models:
+        return run_existing_checkpoints(
+            model_name=args.model_name,
+            n_gpus=n_gpus,
+            ptuning=args.ptuning,
+            lora=args.lora,
+            lora_uids=args.lora_uids,
+            tp_size=args.tp_size,
+            pp_size=args.pp_size,
+            streaming=args.streaming,
+            test_deployment=args.test_deployment,
+            run_accuracy=args.run_accuracy,
+            test_data_path=args.test_data_path,
+            backend=args.backend.lower(),
+            save_trt_engine=args.save_trt_engine,
+            quantization=args.quantization,
+            engine_cache_dir=args.engine_cache_dir,
+            max_num_tokens=args.max_num_tokens,
+        )
+
+    prompt_template = ["The capital of France is", "Largest animal in the sea is"]
+    if args.backend.lower() == "tensorrt-llm":
+        return run_trt_llm_inference(
+            model_name=args.model_name,
+            model_type=args.model_type,
+            prompt=prompt_template,
+            checkpoint_path=args.checkpoint_dir,
+            trt_llm_model_dir=args.trt_llm_model_dir,
+            n_gpu=n_gpus,
+            max_batch_size=args.max_batch_size,
+            max_input_len=args.max_input_len,
+            max_output_len=args.max_output_len,
+            max_num_tokens=args.max_num_tokens,
+            ptuning=args.ptuning,
+            p_tuning_checkpoint=args.p_tuning_checkpoint,
+            lora=args.lora,
+            lora_checkpoint=args.lora_checkpoint,
+            lora_uids=args.lora_uids,
+            tp_size=args.tp_size,
+            pp_size=args.pp_size,
+            top_k=args.top_k,
+            top_p=args.top_p,
+            temperature=args.temperature,
+            run_accuracy=args.run_accuracy,
+            debug=args.debug,
+            streaming=args.streaming,
+            test_deployment=args.test_deployment,
+            test_data_path=args.test_data_path,
+            save_trt_engine=args.save_trt_engine,
+            quantization=args.quantization,
+            engine_cache_dir=args.engine_cache_dir,
+        )
+
+    return run_in_framework_inference(
+        model_name=args.model_name,
+        prompt=prompt_template,
+        checkpoint_path=args.checkpoint_dir,
+        n_gpu=n_gpus,
+        max_batch_size=args.max_batch_size,
+        max_input_len=args.max_input_len,
+        max_output_len=args.max_output_len,
+    )
+
+
+def run_tests_in_parallel(args, n_gpus_list):
+    # Every test runs in its own process on a disjoint set of GPUs, so the engines have to be
+    # kept in separate folders and the tests cannot share the Triton port.
+    if args.backend.lower() != "tensorrt-llm" or args.test_deployment:
+        raise Exception("Parallel sweep is only supported for the TensorRT-LLM backend without deployment.")
+
+    if args.engine_cache_dir is None:
+        raise Exception("Parallel sweep requires the engine_cache_dir param to keep the engines apart.")
+
+    visible_devices = os.environ.get("CUDA_VISIBLE_DEVICES")
+    if visible_devices:
+        devices = visible_devices.split(",")
+    else:
+        devices = [str(i) for i in range(torch.cuda.device_count())]
+
+    if sum(n_gpus_list) > len(devices):
+        raise Exception(
+            "Parallel sweep over {0} gpus requires {1} gpus but only {2} are available.".format(
+                n_gpus_list, sum(n_gpus_list), len(devices)
+            )
+        )
+
+    mp_context = multiprocessing.get_context("spawn")
+    executors = []
+    futures = {}
+    first_device = 0
+    try:
+        try:
+            for n_gpus in sorted(n_gpus_list, reverse=True):
+                executor = ProcessPoolExecutor(max_workers=1, mp_context=mp_context)
+                executors.append(executor)
+                # The worker process is started by submit and inherits the environment at that point, so the
+                # devices are already set when torch and TensorRT-LLM are imported in it.
+                os.environ["CUDA_VISIBLE_DEVICES"] = ",".join(devices[first_device : first_device + n_gpus])
+                futures[n_gpus] = executor.submit(run_test, args, n_gpus)
+                first_device += n_gpus
+        finally:
+            if visible_devices is None:
+                os.environ.pop("CUDA_VISIBLE_DEVICES", None)
+            else:
+                os.environ["CUDA_VISIBLE_DEVICES"] = visible_devices
+
+        return {n_gpus: futures[n_gpus].result() for n_gpus in n_gpus_list}
+    finally:
+        for executor in executors:
+            executor.shutdown()
+
+
 def run_inference_tests(args):
     if args.test_deployment == "True":
         args.test_deployment = True
@@ -605,76 +939,21 @@ def run_inference_tests(args):
         if args.test_data_path is None:
             raise Exception("test_data_path param cannot be None.")
 
-    result_dic = {}
+    if args.max_gpus is None:
+        args.max_gpus = args.min_gpus
 
-    if args.existing_test_models:
-        n_gpus = args.min_gpus
-        if args.max_gpus is None:
-            args.max_gpus = args.min_gpus
-
-        while n_gpus <= args.max_gpus:
-            result_dic[n_gpus] = run_existing_checkpoints(
-                model_name=args.model_name,
-                n_gpus=n_gpus,
-                ptuning=args.ptuning,
-                lora=args.lora,
-                tp_size=args.tp_size,
-                pp_size=args.pp_size,
-                streaming=args.streaming,
-                test_deployment=args.test_deployment,
-                run_accuracy=args.run_accuracy,
-                test_data_path=args.test_data_path,
-                backend=args.backend.lower(),
-                save_trt_engine=args.save_trt_engine,
-            )
+    n_gpus_list = []
+    n_gpus = args.min_gpus
+    while n_gpus <= args.max_gpus:
+        n_gpus_list.append(n_gpus)
+        n_gpus = n_gpus * 2
 
-            n_gpus = n_gpus * 2
+    if args.parallel_sweep:
+        result_dic = run_tests_in_parallel(args, n_gpus_list)
     else:
-        prompt_template = ["The capital of France is", "Largest animal in the sea is"]
-        n_gpus = args.min_gpus
-        if args.max_gpus is None:
-            args.max_gpus = args.min_gpus
-
-        while n_gpus <= args.max_gpus:
-            if args.backend.lower() == "tensorrt-llm":
-                result_dic[n_gpus] = run_trt_llm_inference(
-                    model_name=args.model_name,
-                    model_type=args.model_type,
-                    prompt=prompt_template,
-                    checkpoint_path=args.checkpoint_dir,
-                    trt_llm_model_dir=args.trt_llm_model_dir,
-                    n_gpu=n_gpus,
-                    max_batch_size=args.max_batch_size,
-                    max_input_len=args.max_input_len,
-                    max_output_len=args.max_output_len,
-                    ptuning=args.ptuning,
-                    p_tuning_checkpoint=args.p_tuning_checkpoint,
-                    lora=args.lora,
-                    lora_checkpoint=args.lora_checkpoint,
-                    tp_size=args.tp_size,
-                    pp_size=args.pp_size,
-                    top_k=args.top_k,
-                    top_p=args.top_p,
-                    temperature=args.temperature,
-                    run_accuracy=args.run_accuracy,
-                    debug=args.debug,
-                    streaming=args.streaming,
-                    test_deployment=args.test_deployment,
-                    test_data_path=args.test_data_path,
-                    save_trt_engine=args.save_trt_engine,
-                )
-            else:
-                result_dic[n_gpus] = run_in_framework_inference(
-                    model_name=args.model_name,
-                    prompt=prompt_template,
-                    checkpoint_path=args.checkpoint_dir,
-                    n_gpu=n_gpus,
-                    max_batch_size=args.max_batch_size,
-                    max_input_len=args.max_input_len,
-                    max_output_len=args.max_output_len,
-                )
-
-            n_gpus = n_gpus * 2
+        result_dic = {}
+        for n_gpus in n_gpus_list:
+            result_dic[n_gpus] = run_test(args, n_gpus)
 
     test_result = "PASS"
     print_separator = False
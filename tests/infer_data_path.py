@@ -12,10 +12,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import functools
 import urllib.request as req
 from pathlib import Path
 
 
+@functools.lru_cache(maxsize=1)
 def get_infer_test_data():
     test_data = {}
 